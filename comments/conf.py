@@ -51,6 +51,17 @@ class Setting(dict):
     __getattr__ = __getitem__
 
 
+def as_list(value):
+    """
+    Normalise a database alias or a collection of aliases to a list
+    (``random.choice`` needs a sequence, and a plain string must not be split
+    into single characters).
+    """
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
+
 settings = Setting(getattr(djsettings, "COMMENTS_SETTINGS", {}))
 settings.setdefault("MAX_LENGTH", 3000)
 settings.setdefault("ENABLE_CAPTCHA", True)
@@ -88,3 +99,17 @@ gravatar.setdefault("DEFAULT_RATING", gravatar.RATING_G)
 gravatar.setdefault("DEFAULT_SECURE", True)
 
 settings.GRAVATAR = gravatar
+
+router = getattr(settings, "ROUTER", Setting())
+
+# database alias receiving every write (and pinned reads)
+router.setdefault("PRIMARY", "default")
+# database aliases used for comment reads, empty means read from PRIMARY
+router.setdefault("REPLICAS", [])
+router.REPLICAS = as_list(router.REPLICAS)
+# seconds a user's reads stay on PRIMARY after posting or moderating a comment
+router.setdefault("PIN_TIMEOUT", 15)
+router.setdefault("COOKIE_NAME", "comments_pinned")
+router.setdefault("COOKIE_SECURE", getattr(djsettings, "SESSION_COOKIE_SECURE", False))
+
+settings.ROUTER = router
@@ -22,6 +22,7 @@ from django.utils.translation import gettext_lazy as _
 from fluo import forms
 
 from .conf import settings
+from .routers import pin_to_primary
 
 if settings.ENABLE_CAPTCHA:
     # fail fast
@@ -54,9 +55,11 @@ class ModerateForm(BaseForm):
         from . import get_comment_model
 
         Comment = get_comment_model()
-        comment = Comment.objects.get(pk=self.cleaned_data.get("pk"))
+        comment = Comment.objects.primary().get(pk=self.cleaned_data.get("pk"))
         comment.is_removed = not comment.is_removed
         if commit:
+            # pin first, so that post_save receivers read the new comment
+            pin_to_primary(request)
             comment.save()
         return comment
 
@@ -82,7 +85,7 @@ class CommentForm(BaseForm):
         comment = Comment()
         pk = self.cleaned_data.get("parent", None)
         if pk:
-            comment.parent = Comment.objects.get(pk=pk)
+            comment.parent = Comment.objects.primary().get(pk=pk)
         comment.post = post
         comment.comment = self.cleaned_data.get("message")
         if self.user.is_authenticated:
@@ -93,5 +96,7 @@ class CommentForm(BaseForm):
             comment.name = self.cleaned_data.get("name")
             comment.email = self.cleaned_data.get("email")
         if commit:
+            # pin first, so that post_save receivers read the new comment
+            pin_to_primary(request)
             comment.save()
         return comment
@@ -44,6 +44,14 @@ class CommentQuerySet(models.QuerySet):
     def removed(self):
         return self.filter(is_removed=True)
 
+    def primary(self):
+        """
+        Read from the primary database even when replicas are configured.
+        """
+        clone = self._chain()
+        clone._hints = dict(self._hints, primary=True)
+        return clone
+
 
 class CommentManager(models.Manager.from_queryset(CommentQuerySet)):
     pass
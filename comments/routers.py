@@ -0,0 +1,148 @@
+# Copyright (C) 2007-2020, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+import random
+from contextlib import contextmanager
+
+from asgiref.local import Local
+from django.db import connections
+
+from .conf import settings
+
+ROUTER = settings.ROUTER
+
+PIN_COOKIE_SALT = "comments.routers.pin"
+
+_locals = Local()
+
+
+@contextmanager
+def bind_request(request):
+    """
+    Make ``request`` the current request for the router while the block runs,
+    so that ``is_pinned`` can look at its pin cookie.
+    """
+    previous = getattr(_locals, "request", None)
+    _locals.request = request
+    try:
+        yield request
+    finally:
+        _locals.request = previous
+
+
+def pin_to_primary(request):
+    """
+    Send comment reads to the primary database for the rest of ``request``
+    and, through a signed cookie set by ``ReadYourWritesMiddleware``, for the
+    next ``PIN_TIMEOUT`` seconds of the user's requests (read-your-writes).
+    """
+    if request is not None:
+        request._comments_pin = True
+        request._comments_pinned = True
+
+
+def is_pinned(request=None):
+    """
+    Tell if comment reads for ``request`` (default to the bound one) must go to
+    the primary database. The cookie is only checked once per request.
+    """
+    if request is None:
+        request = getattr(_locals, "request", None)
+    if request is None:
+        return False
+    if not hasattr(request, "_comments_pinned"):
+        request._comments_pinned = (
+            request.get_signed_cookie(
+                ROUTER.COOKIE_NAME, default=None, salt=PIN_COOKIE_SALT, max_age=ROUTER.PIN_TIMEOUT,
+            )
+            is not None
+        )
+    return request._comments_pinned
+
+
+def set_pin_cookie(request, response):
+    """
+    Store the pin requested by ``pin_to_primary`` in the response.
+    """
+    if getattr(request, "_comments_pin", False):
+        response.set_signed_cookie(
+            ROUTER.COOKIE_NAME,
+            "1",
+            salt=PIN_COOKIE_SALT,
+            max_age=ROUTER.PIN_TIMEOUT,
+            secure=ROUTER.COOKIE_SECURE,
+            httponly=True,
+            samesite="Lax",
+        )
+    return response
+
+
+def _is_comment_label(app_label, model_name):
+    return "{}.{}".format(app_label, model_name).lower() == settings.COMMENT_MODEL.lower()
+
+
+def _is_comment_model(model):
+    # match on the label, historical models used by migrations lose their abstract bases
+    return _is_comment_label(model._meta.app_label, model._meta.model_name)
+
+
+class CommentRouter(object):
+    """
+    Route comment reads to ``COMMENTS_SETTINGS["ROUTER"]["REPLICAS"]`` and
+    comment writes to ``COMMENTS_SETTINGS["ROUTER"]["PRIMARY"]``.
+
+    Reads go to the primary when the current request is pinned (see
+    ``pin_to_primary`` and ``ReadYourWritesMiddleware``) or when the queryset
+    carries the ``primary`` hint (see ``CommentQuerySet.primary``), and while
+    a transaction is open on the primary. Other
+    models are left to the next router, so Django reads objects related to a
+    comment (its user, site, post, ...) from the database of that comment.
+    """
+
+    def _databases(self):
+        return {ROUTER.PRIMARY, *ROUTER.REPLICAS}
+
+    def db_for_read(self, model, **hints):
+        if not _is_comment_model(model):
+            return None
+        if hints.get("primary") or is_pinned() or not ROUTER.REPLICAS:
+            return ROUTER.PRIMARY
+        if connections[ROUTER.PRIMARY].in_atomic_block:
+            # never read a lagging replica in the middle of a write
+            return ROUTER.PRIMARY
+        return random.choice(ROUTER.REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        if not _is_comment_model(model):
+            return None
+        return ROUTER.PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not (_is_comment_model(type(obj1)) or _is_comment_model(type(obj2))):
+            return None
+        databases = self._databases()
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if model_name is None or not _is_comment_label(app_label, model_name):
+            return None
+        return db == ROUTER.PRIMARY
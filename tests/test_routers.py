@@ -0,0 +1,208 @@
+# Copyright (C) 2007-2020, Raffaele Salmaso <raffaele@salmaso.org>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.  IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+
+import time
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sites.models import Site
+from django.db import connections, transaction
+from django.db.models.signals import post_save
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase
+
+from comments.conf import as_list, settings
+from comments.forms import CommentForm, ModerateForm
+from comments.middleware import ReadYourWritesMiddleware
+from comments.routers import CommentRouter, bind_request, is_pinned, pin_to_primary
+
+from .models import Comment
+
+ROUTER = settings.ROUTER
+
+
+class CommentRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = CommentRouter()
+
+    def test_replicas_as_list(self):
+        self.assertEqual(as_list("replica"), ["replica"])
+        self.assertEqual(as_list(("replica", "replica2")), ["replica", "replica2"])
+        self.assertEqual(as_list({"replica"}), ["replica"])
+        self.assertEqual(as_list([]), [])
+
+    def test_db_for_read(self):
+        self.assertEqual(self.router.db_for_read(Comment), "replica")
+        self.assertEqual(self.router.db_for_read(Comment, primary=True), "default")
+        self.assertIsNone(self.router.db_for_read(User))
+
+    def test_db_for_read_without_replicas(self):
+        with mock.patch.dict(ROUTER, {"REPLICAS": []}):
+            self.assertEqual(self.router.db_for_read(Comment), "default")
+
+    def test_db_for_read_related_to_comment(self):
+        comment = Comment(site_id=1)
+        comment._state.db = "replica"
+        self.assertIsNone(self.router.db_for_read(User, instance=comment))
+        self.assertIsNone(self.router.db_for_read(User, instance=User()))
+
+    def test_db_for_write(self):
+        self.assertEqual(self.router.db_for_write(Comment), "default")
+        self.assertIsNone(self.router.db_for_write(User))
+
+    def test_allow_relation(self):
+        comment, user = Comment(site_id=1), User()
+        comment._state.db, user._state.db = "replica", "default"
+        self.assertIs(self.router.allow_relation(comment, user), True)
+        self.assertIsNone(self.router.allow_relation(user, User()))
+
+    def test_allow_migrate(self):
+        self.assertIs(self.router.allow_migrate("replica", "tests", "comment"), False)
+        self.assertIs(self.router.allow_migrate("default", "tests", "comment"), True)
+        self.assertIs(self.router.allow_migrate("analytics", "tests", "comment"), False)
+        self.assertIsNone(self.router.allow_migrate("replica", "auth", "user"))
+        self.assertIsNone(self.router.allow_migrate("replica", "tests"))
+
+    def test_primary_hint(self):
+        self.assertEqual(Comment.objects.all().db, "replica")
+        self.assertEqual(Comment.objects.primary().db, "default")
+        self.assertEqual(Comment.objects.primary().public().roots().db, "default")
+        self.assertEqual(Comment.objects.public().db, "replica")
+
+
+class ReadYourWritesTest(TransactionTestCase):
+    # TestCase wraps each test in a transaction, which pins reads to the primary
+    databases = {"default", "replica"}
+
+    @classmethod
+    def setUpClass(cls):
+        # allow_migrate keeps the comments table off the replica, create an
+        # empty one to simulate a replica lagging behind the primary
+        with connections["replica"].schema_editor() as editor:
+            editor.create_model(Comment)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        with connections["replica"].schema_editor() as editor:
+            editor.delete_model(Comment)
+
+    def setUp(self):
+        Site.objects.get_or_create(pk=1, defaults={"domain": "example.com", "name": "example.com"})
+        Site.objects.clear_cache()
+        self.factory = RequestFactory()
+
+    def post_comment(self, request):
+        pin_to_primary(request)
+        Comment.objects.create(site=Site.objects.get_current(), comment="comment")
+        return HttpResponse()
+
+    def count_comments(self, request):
+        return HttpResponse(str(Comment.objects.count()))
+
+    def get(self, view, cookies=None):
+        request = self.factory.get("/")
+        request.COOKIES.update(cookies or {})
+        return ReadYourWritesMiddleware(view)(request)
+
+    def test_reads_from_replica(self):
+        Comment.objects.create(site=Site.objects.get_current(), comment="comment")
+        self.assertEqual(self.get(self.count_comments).content, b"0")
+
+    def test_pin_after_write(self):
+        response = self.get(self.post_comment)
+        cookie = response.cookies[ROUTER.COOKIE_NAME]
+        self.assertEqual(cookie["max-age"], ROUTER.PIN_TIMEOUT)
+        self.assertEqual(cookie["secure"], "")
+        cookies = {ROUTER.COOKIE_NAME: cookie.value}
+        self.assertEqual(self.get(self.count_comments, cookies).content, b"1")
+        self.assertEqual(self.get(self.count_comments).content, b"0")
+
+    def test_secure_cookie(self):
+        with mock.patch.dict(ROUTER, {"COOKIE_SECURE": True}):
+            response = self.get(self.post_comment)
+        self.assertIs(response.cookies[ROUTER.COOKIE_NAME]["secure"], True)
+
+    def test_pin_expires(self):
+        cookies = {ROUTER.COOKIE_NAME: self.get(self.post_comment).cookies[ROUTER.COOKIE_NAME].value}
+        expired = time.time() + ROUTER.PIN_TIMEOUT + 1
+        with mock.patch("django.core.signing.time.time", return_value=expired):
+            self.assertEqual(self.get(self.count_comments, cookies).content, b"0")
+
+    def test_tampered_cookie(self):
+        self.assertEqual(self.get(self.count_comments, {ROUTER.COOKIE_NAME: "1"}).content, b"0")
+
+    def test_unpin_after_request(self):
+        self.get(self.post_comment)
+        self.assertFalse(is_pinned())
+        self.assertEqual(Comment.objects.all().db, "replica")
+
+    def test_pin_without_middleware(self):
+        request = self.factory.get("/")
+        pin_to_primary(request)
+        self.assertEqual(Comment.objects.all().db, "replica")
+        with bind_request(request):
+            self.assertEqual(Comment.objects.all().db, "default")
+        self.assertEqual(Comment.objects.all().db, "replica")
+
+    def test_comment_form_pins(self):
+        request = self.factory.post("/")
+        form = CommentForm({"name": "name", "email": "name@example.com", "message": "comment"}, user=AnonymousUser())
+        self.assertTrue(form.is_valid())
+        form.save(request, post=None)
+        self.assertTrue(is_pinned(request))
+        with bind_request(request):
+            self.assertEqual(Comment.objects.count(), 1)
+
+    def test_post_save_receivers_read_primary(self):
+        request = self.factory.post("/")
+        counts = []
+
+        def receiver(sender, instance, **kwargs):
+            counts.append(Comment.objects.count())
+
+        post_save.connect(receiver, sender=Comment)
+        self.addCleanup(post_save.disconnect, receiver, sender=Comment)
+        form = CommentForm({"name": "name", "email": "name@example.com", "message": "comment"}, user=AnonymousUser())
+        self.assertTrue(form.is_valid())
+        with bind_request(request):
+            form.save(request, post=None)
+        self.assertEqual(counts, [1])
+
+    def test_reads_primary_in_transaction(self):
+        with transaction.atomic():
+            Comment.objects.create(site=Site.objects.get_current(), comment="comment")
+            self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Comment.objects.count(), 0)
+
+    def test_moderate_form_pins(self):
+        # the comment exists only on the primary, the replica is lagging
+        comment = Comment.objects.create(site=Site.objects.get_current(), comment="comment")
+        self.assertFalse(Comment.objects.filter(pk=comment.pk).exists())
+        request = self.factory.post("/")
+        form = ModerateForm({"pk": str(comment.pk)})
+        self.assertTrue(form.is_valid())
+        with bind_request(request):
+            moderated = form.save(request, post=None)
+        self.assertTrue(moderated.is_removed)
+        self.assertTrue(is_pinned(request))
+        self.assertTrue(Comment.objects.primary().get(pk=comment.pk).is_removed)